@@ -2,7 +2,9 @@ import spacy
 import pandas as pd
 import re
 import logging
-from typing import Dict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, List
 from tqdm import tqdm
 import numpy as np
 from argparse import ArgumentParser
@@ -10,6 +12,39 @@ import os
 
 logging.basicConfig(level=logging.INFO)
 
+# Morphological tags the detector tests for, encoded as bits so that each
+# membership check is a single integer AND instead of a scan over the split
+# feats list. Tags outside this set are never queried and carry no bit.
+TAG_BITS = {
+    'sg': 1 << 0, 'pl': 1 << 1,
+    'pri': 1 << 2, 'sec': 1 << 3,
+    'inst': 1 << 4, 'gen': 1 << 5, 'voc': 1 << 6,
+    'f': 1 << 7, 'm1': 1 << 8, 'm2': 1 << 9, 'm3': 1 << 10,
+}
+SG, PL, PRI, SEC, INST, GEN, VOC, FEM, M1, M2, M3 = (
+    TAG_BITS[t] for t in ('sg', 'pl', 'pri', 'sec', 'inst', 'gen', 'voc', 'f', 'm1', 'm2', 'm3'))
+MASC = M1 | M2 | M3
+NUMBER = SG | PL
+
+# English-side trigger patterns, compiled once at import. These only ever
+# feed boolean checks, so search() (which stops at the first hit) replaces
+# the findall() calls that materialised every match. Matching IGNORECASE
+# also saves allocating a lowered copy of the sentence per call.
+_PLEASE_RE = re.compile(r'please|ask', re.IGNORECASE)
+_TITLE_RE = re.compile(r"lad(ies|y)|gentlem[ea]n|(^| )(sir|mr[ .]|mrs[ .]|ms[ .]|herr)|"
+                       r"lord|master|messieurs|dames|monsieur|madam[e ]|ma'am", re.IGNORECASE)
+_NATION_RE = re.compile(r'countr|nation|land|state|kingdom|realm|econom|elsewhere|rule', re.IGNORECASE)
+
+# Dependency/POS guard sets, interned once; the inline list literals they
+# replace were re-allocated and linearly scanned on every token.
+_CONTENT_POS = frozenset({'NOUN', 'VERB', 'ADJ'})
+_VERB_PRON = frozenset({'VERB', 'PRON'})
+_SP_VERB_DEPS = frozenset({'aux:clitic', 'aux', 'aux:pass'})
+_AUX_COP = frozenset({'aux:clitic', 'cop'})
+_ADJ_DEPS = frozenset({'aux:clitic', 'aux:pass', 'cop', 'obl:cmpr', 'obl'})
+_IL_ADJ_DEPS = frozenset({'xcomp:pred', 'nsubj', 'conj', 'iobj', 'xcomp', 'amod', 'vocative', 'obl:cmpr'})
+_APPOS_OBJ = frozenset({'appos', 'obj'})
+
 
 class Attributes:
     def __init__(self):
@@ -21,6 +56,7 @@ class Attributes:
         }
         self.attribute_list = list(self.types.keys())
         self.type_list = [a for b in self.types.values() for a in b]
+        self._type_to_attr = {t: attr for attr, ts in self.types.items() for t in ts}
         self.reverse_map = {
             '<sp:feminine>': '<sp:masculine>',
             '<sp:masculine>': '<sp:feminine>',
@@ -35,10 +71,10 @@ class Attributes:
         }
 
     def identify_from_type(self, attr_type):
-        for attr, types in self.types.items():
-            if attr_type in types:
-                return attr
-        logging.error(f"Tried to identify a type which does not exist: {attr_type}")
+        try:
+            return self._type_to_attr[attr_type]
+        except KeyError:
+            logging.error(f"Tried to identify a type which does not exist: {attr_type}")
 
     @staticmethod
     def types_to_str(types):
@@ -54,10 +90,49 @@ class Attributes:
         return ' '.join(pattern)
 
 
+@dataclass
+class ParsedSentence:
+    """Token attributes of a parsed Doc, materialised once as parallel lists.
+
+    Every check below used to go through spaCy's attribute and extension
+    getters (Python-level calls) for each token it touched, often several
+    times over; indexing plain lists instead keeps the per-token loops tight.
+    """
+    doc: object
+    flags: List[int]
+    head_flags: List[int]
+    pos: List[str]
+    head_pos: List[str]
+    dep: List[str]
+    head_i: List[int]
+    children: List[List[int]]
+    lemma: List[str]
+    lemma_lower: List[str]
+    orth: List[str]
+
+    def __len__(self):
+        return len(self.pos)
+
+
 class Detector:
-    def __init__(self, path_to_root):
+    # Pipeline components the detector relies on: tagger (pos_, _.feats),
+    # morphologizer where the model ships one, parser (dep_, head) and
+    # ner (doc.ents, used by check_interlocutor). Anything else the model
+    # loads by default is pure per-sentence overhead and is disabled.
+    REQUIRED_PIPES = ('tagger', 'morphologizer', 'parser', 'ner')
+
+    # Below this many sentences the cost of spawning parser workers outweighs
+    # the parallel parse, so small batches stay in-process.
+    MULTIPROCESSING_THRESHOLD = 200
+
+    def __init__(self, path_to_root, batch_size=64, n_process=None):
+        self.batch_size = batch_size
+        self.n_process = n_process if n_process else max(1, os.cpu_count() - 1)
         try:
             nlp = spacy.load('pl_spacy_model_morfeusz_big')
+            unneeded = [p for p in nlp.pipe_names if p not in self.REQUIRED_PIPES]
+            if unneeded:
+                nlp.disable_pipes(*unneeded)
             self.nlp = nlp
         except ValueError:
             assert hasattr(self, 'nlp')
@@ -65,50 +140,107 @@ class Detector:
             stopwords = f.read().splitlines()
         self.stopwords = stopwords
         self.attribs = Attributes()
-
-    def parse_sentence(self, sentence):
-        try:
-            parsed = self.nlp(sentence)
-        except KeyboardInterrupt:
-            raise
-        except Exception as e:
-            logging.info(e)
-            return ""
-        return parsed
+        self._attr_keys = tuple(self.attribs.attribute_list)
+
+    # One nlp.pipe call covers this many batches. A raised pipe kills its
+    # remaining output, so sentences are fed in bounded chunks and a chunk
+    # that raises is re-parsed sentence by sentence.
+    CHUNK_BATCHES = 100
+
+    def parse_sentences(self, sentences, batch_size=None, n_process=None, as_tuples=False, n_sents=None):
+        """Parse sentences in batches through nlp.pipe, yielding one Doc per sentence.
+
+        Batching amortises the per-call overhead of the parser. When a chunk of
+        the pipe raises, its not-yet-yielded sentences are re-parsed one at a
+        time, so exactly the sentence which fails yields "" and every other
+        sentence still comes back parsed. Parsing fans out over n_process
+        workers unless the batch is too small for the worker start-up cost to
+        pay off. With as_tuples, `sentences` holds (text, context) pairs and
+        the context is passed through untouched; n_sents supplies the length
+        when `sentences` is a generator.
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+        if n_process is None:
+            n_process = self.n_process
+        if n_sents is None and hasattr(sentences, '__len__'):
+            n_sents = len(sentences)
+        if n_sents is not None and n_sents < self.MULTIPROCESSING_THRESHOLD:
+            n_process = 1
+
+        chunk_size = batch_size * self.CHUNK_BATCHES
+        iterator = iter(sentences)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            parsed = 0
+            try:
+                for doc in self.nlp.pipe(chunk, batch_size=batch_size, n_process=n_process, as_tuples=as_tuples):
+                    yield doc
+                    parsed += 1
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                logging.info(e)
+                yield from self._parse_one_by_one(chunk[parsed:], as_tuples=as_tuples)
+
+    def _parse_one_by_one(self, sentences, as_tuples=False):
+        """Per-sentence fallback isolating a parse failure to the sentence that raised it."""
+        for item in sentences:
+            text, context = item if as_tuples else (item, None)
+            try:
+                doc = self.nlp(text)
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                logging.info(e)
+                doc = ""
+            yield (doc, context) if as_tuples else doc
 
     def initialise_types(self):
-        return {k: None for k in self.attribs.attribute_list}
+        # dict.fromkeys over a cached key tuple is the cheapest way to build
+        # this dict, and it is allocated once per sentence.
+        return dict.fromkeys(self._attr_keys)
 
     def calculate_type_agreement(self, sents, en_sents, attr_type):
         # Used for evaluation.
         rev_type = [self.attribs.reverse_map[x] for x in attr_type]
+        # Detection is deterministic and independent of the queried type, so run
+        # it once per sentence and compare against both the predicted and
+        # reverse type, rather than re-running verify_context for each.
+        docs = tqdm(self.parse_sentences(sents), total=len(sents))
+        predicted = [self._predict_types_from_doc(doc, en_sents[i]) for i, doc in enumerate(docs)]
         # A list of bools depending on whether ith sentence agreed to the ith type
-        correct = [self.verify_context(sents[i], en_sents[i], attr_type[i]) for i in tqdm(range(len(sents)))]
-        incorrect = [self.verify_context(sents[i], en_sents[i], rev_type[i]) for i in tqdm(range(len(sents)))]
-
-        corr = {
-            x: np.sum(np.array(correct)
-                      & np.array([t_ in self.attribs.types[x] for t_ in attr_type]))
-            for x in self.attribs.attribute_list
-        }
-        incorr = {
-            x: np.sum(np.array(incorrect)
-                      & np.array([t_ in self.attribs.types[x] for t_ in rev_type]))
-            for x in self.attribs.attribute_list
-        }
+        correct = [predicted[i][self.attribs.identify_from_type(attr_type[i])] == attr_type[i]
+                   for i in range(len(predicted))]
+        incorrect = [predicted[i][self.attribs.identify_from_type(rev_type[i])] == rev_type[i]
+                     for i in range(len(predicted))]
+
+        # Aggregate with a single bincount pass per outcome rather than building
+        # fresh boolean arrays for every attribute. A type and its reverse always
+        # belong to the same attribute, so one id array serves both outcomes.
+        attr_names = self.attribs.attribute_list
+        attr_id = np.array([attr_names.index(self.attribs.identify_from_type(t_)) for t_ in attr_type],
+                           dtype=np.int8)
+        correct, incorrect = np.array(correct, dtype=bool), np.array(incorrect, dtype=bool)
+        corr_counts = np.bincount(attr_id[correct], minlength=len(attr_names))
+        incorr_counts = np.bincount(attr_id[incorrect], minlength=len(attr_names))
+        corr = {x: corr_counts[k] for k, x in enumerate(attr_names)}
+        incorr = {x: incorr_counts[k] for k, x in enumerate(attr_names)}
         logging.info(f"Correct assignments:   {corr}\nIncorrect assignments: {incorr}")
         return corr, incorr
 
-    def verify_context(self, sentence: str, en_sentence: str, predicted_type: str) -> bool:
+    def verify_context(self, parsed_pl, en_sentence: str, predicted_type: str) -> bool:
         """Verify whether the predicted type matches actual types detected from the given sentences.
 
-        :param sentence: raw sentence in Polish.
+        :param parsed_pl: parsed sentence in Polish.
         :param en_sentence: raw sentence in English.
         :param predicted_type: type predicted by the model.
         :return: True if type matches actual type, else False.
         """
         attr = self.attribs.identify_from_type(predicted_type)
-        return self.predict_types(sent_pair={'pl': sentence, 'en': en_sentence})[attr] == predicted_type
+        return self._predict_types_from_doc(parsed_pl, en_sentence)[attr] == predicted_type
 
     def predict_types(self, sent_pair) -> Dict[str, str]:
         """
@@ -123,131 +255,197 @@ class Detector:
         :param sent_pair:   input data
         :return:            a dictionary of types.
         """
-        parsed_pl = self.parse_sentence(sent_pair['pl'])
+        parsed_pl = next(self.parse_sentences([sent_pair['pl']], n_process=1))
+        return self._predict_types_from_doc(parsed_pl, sent_pair['en'])
+
+    @staticmethod
+    def _doc_to_soa(doc):
+        """Materialise the token attributes used by the checks into a ParsedSentence."""
+        flags = []
+        for t in doc:
+            bits = 0
+            for tag in t._.feats.split(':'):
+                bits |= TAG_BITS.get(tag, 0)
+            flags.append(bits)
+        head_i = [t.head.i for t in doc]
+        children = [[] for _ in head_i]
+        for k, h in enumerate(head_i):
+            if h != k:  # the root token is its own head
+                children[h].append(k)
+        lemma = [t.lemma_ for t in doc]
+        return ParsedSentence(
+            doc=doc,
+            flags=flags,
+            head_flags=[flags[h] for h in head_i],
+            pos=[t.pos_ for t in doc],
+            head_pos=[t.head.pos_ for t in doc],
+            dep=[t.dep_ for t in doc],
+            head_i=head_i,
+            children=children,
+            lemma=lemma,
+            lemma_lower=[l.lower() for l in lemma],
+            orth=[t.orth_ for t in doc],
+        )
+
+    def _predict_types_from_doc(self, parsed_pl, en_sentence: str) -> Dict[str, str]:
+        """As predict_types, but operating on an already-parsed Polish Doc."""
+        soa = self._doc_to_soa(parsed_pl)
         types = self.initialise_types()
-        # 1. Check SpGender.
-        types = self.check_speaker_gender(parsed_pl, types=types)
-        # 2. Check formality. If sentence is matched as formal, then return the right features and quit.
-        # Lemma suggests formal addressing and no_det makes sure that there are no determinants (e.g. lady vs this lady)
-        types, sent_is_formal = self.check_if_formal(parsed_pl, sent_pair['en'], types)
-        if sent_is_formal:
-            return types
-
-        # 3. If sentence did not match as formal, then keep looking for other interlocutor features.
-        # If found, annotate sentence as informal.
-        types = self.check_interlocutor(parsed_pl, types)
-        return types
+        # check_if_formal only ever acts on a handful of lemma/orth triggers, so a
+        # cheap prescan lets trigger-free sentences (the common case) skip it.
+        if self._has_formal_trigger(soa):
+            # 1. Check SpGender.
+            types = self.check_speaker_gender(soa, types=types)
+            # 2. Check formality. If sentence is matched as formal, then return the right features and quit.
+            # Lemma suggests formal addressing and no_det makes sure that there are no determinants (e.g. lady vs this lady)
+            types, sent_is_formal = self.check_if_formal(soa, en_sentence, types)
+            if sent_is_formal:
+                return types
+            # 3. If sentence did not match as formal, then keep looking for other interlocutor features.
+            # If found, annotate sentence as informal.
+            return self.check_interlocutor(soa, types)
+
+        # No formal trigger: run the SpGender and interlocutor checks fused
+        # into a single pass over the tokens.
+        return self._scan_doc(soa, types)
 
     def annotate(self, data):
-        en, pl = data['en'].tolist(), data['pl'].tolist()
+        # Stream (polish, english) pairs straight through the parser instead of
+        # materialising both columns as lists first; as_tuples carries the
+        # English side through the pipe untouched.
+        pairs = ((pl_, en_) for pl_, en_ in zip(data['pl'], data['en']))
+        docs = self.parse_sentences(pairs, as_tuples=True, n_sents=len(data))
         annotations = []
-        for en_, pl_ in tqdm(zip(en, pl)):
-            types = self.predict_types({'en': en_, 'pl': pl_})
+        for parsed_pl, en_ in tqdm(docs, total=len(data)):
+            types = self._predict_types_from_doc(parsed_pl, en_)
             annotations.append(self.attribs.types_to_str(types))
         return annotations
 
-    def check_speaker_gender(self, sentence, types=None):
+    def check_speaker_gender(self, soa, types=None):
         if types is None:
             types = self.initialise_types()
+        return self._scan_doc(soa, types, interlocutor=False)
+
+    def check_interlocutor(self, soa, types):
+        return self._scan_doc(soa, types, speaker=False)
 
-        for token in sentence:
-            token_feats = token._.feats.split(':')
-            head_feats = token.head._.feats.split(':')
-            if token.head.pos_ not in ['NOUN', 'VERB', 'ADJ']: continue
+    def _scan_doc(self, soa, types, speaker=True, interlocutor=True):
+        """Run the SpGender and/or interlocutor checks in one pass over the tokens.
 
-            if 'sg' in token_feats and 'pri' in token_feats:
+        The two checks write disjoint keys of `types` and never read them back,
+        so interleaving them per token is equivalent to running the original
+        two loops back to back, but traverses the token lists only once.
+        """
+        # Entity texts are gathered at most once per doc (and only when a
+        # candidate noun is actually hit), not once per matching token.
+        ner_texts = None
+        for i in range(len(soa)):
+            token_flags = soa.flags[i]
+            head_flags = soa.head_flags[i]
+            head_pos = soa.head_pos[i]
+
+            if speaker and head_pos in _CONTENT_POS \
+                    and token_flags & SG and token_flags & PRI:
                 # Past tense and future tense verbs
-                if token.head.pos_ == 'VERB' and token.dep_ in ['aux:clitic', 'aux', 'aux:pass']:
-                    types = self.gender_check(token.head, types, 'SpGender')
+                if head_pos == 'VERB' and soa.dep[i] in _SP_VERB_DEPS:
+                    types = self.gender_check(head_flags, types, 'SpGender')
 
                 # Nouns
-                if token.head.pos_ == 'NOUN' and 'inst' in head_feats:
-                    if token.dep_ in ['aux:clitic', 'cop']:
-                        if self.no_adp(sentence, token.i, token.head.i):
-                            if token.head.lemma_.lower() not in self.stopwords:
-                                types = self.gender_check(token.head, types, 'SpGender')
+                if head_pos == 'NOUN' and head_flags & INST:
+                    if soa.dep[i] in _AUX_COP:
+                        if self.no_adp(soa, i, soa.head_i[i]):
+                            if soa.lemma_lower[soa.head_i[i]] not in self.stopwords:
+                                types = self.gender_check(head_flags, types, 'SpGender')
 
                 # Adjectives
-                if token.head.pos_ == 'ADJ':
-                    if token.dep_ in ['aux:clitic', 'aux:pass', 'cop', 'obl:cmpr', 'obl']:
-                        types = self.gender_check(token.head, types, 'SpGender')
-        return types
+                if head_pos == 'ADJ':
+                    if soa.dep[i] in _ADJ_DEPS:
+                        types = self.gender_check(head_flags, types, 'SpGender')
+
+            if not interlocutor:
+                continue
 
-    def check_interlocutor(self, sentence, types):
-        for token in sentence:
-            token_feats = token._.feats.split(':')
-            head_feats = token.head._.feats.split(':')
-            for number in ('sg', 'pl'):
-                if number in head_feats and 'sec' in head_feats:
-                    if token.head.pos_ in ['VERB', 'PRON']:
-                        types['IlNumber'] = '<singular>' if number == 'sg' else '<plural>'
+            for number, il_number in ((SG, '<singular>'), (PL, '<plural>')):
+                if head_flags & number and head_flags & SEC:
+                    if head_pos in _VERB_PRON:
+                        types['IlNumber'] = il_number
                         types['Formality'] = '<informal>'
-                        if token.pos_ == 'ADJ' and number in token_feats:
-                            if token.dep_ in ['xcomp:pred', 'nsubj', 'conj', 'nsubj', 'iobj', 'xcomp',
-                                              'amod', 'vocative', 'obl:cmpr']:
-                                types = self.gender_check(token, types, 'IlGender')
-
-                        if token.pos_ == 'NOUN':
-                            if token.dep_ == 'vocative' or (token.dep_ in ['appos', 'obj'] and 'voc' in token_feats):
-                                ner = [a.text for a in sentence.ents]
-                                if token.orth_ not in ner:
-                                    types = self.gender_check(token, types, 'IlGender')
+                        if soa.pos[i] == 'ADJ' and token_flags & number:
+                            if soa.dep[i] in _IL_ADJ_DEPS:
+                                types = self.gender_check(token_flags, types, 'IlGender')
+
+                        if soa.pos[i] == 'NOUN':
+                            if soa.dep[i] == 'vocative' or (soa.dep[i] in _APPOS_OBJ and token_flags & VOC):
+                                if ner_texts is None:
+                                    ner_texts = frozenset(a.text for a in soa.doc.ents)
+                                if soa.orth[i] not in ner_texts:
+                                    types = self.gender_check(token_flags, types, 'IlGender')
             continue_check = False
             # Your/yours
-            if token.lemma_.lower() == 'twój':
+            if soa.lemma_lower[i] == 'twój':
                 types['IlNumber'] = '<singular>'
                 types['Formality'] = '<informal>'
-            if token.lemma_.lower() == 'wasz':
+            if soa.lemma_lower[i] == 'wasz':
                 types['IlNumber'] = '<plural>'
                 types['Formality'] = '<informal>'
-            for number in ('sg', 'pl'):
-                if 'sec' in token_feats and number in token_feats:
-                    if not (token.orth_ == 'ś' and sentence[token.i - 1].orth_ in ['czym', 'kim']):
-                        types['IlNumber'] = '<singular>' if number == 'sg' else '<plural>'
+            for number, il_number in ((SG, '<singular>'), (PL, '<plural>')):
+                if token_flags & SEC and token_flags & number:
+                    if not (soa.orth[i] == 'ś' and soa.orth[i - 1] in ['czym', 'kim']):
+                        types['IlNumber'] = il_number
                         types['Formality'] = '<informal>'
                         continue_check = True
             if continue_check:
                 # Past tense and future tense verbs
-                if token.head.pos_ == 'VERB' and token.dep_ in ['aux:clitic', 'aux', 'aux:pass']:
-                    types = self.gender_check(token.head, types, 'IlGender')
+                if head_pos == 'VERB' and soa.dep[i] in _SP_VERB_DEPS:
+                    types = self.gender_check(head_flags, types, 'IlGender')
                 # Nouns
-                if token.head.pos_ == 'NOUN':
-                    if token.dep_ in ['aux:clitic', 'cop']:
-                        if self.no_adp(sentence, token.i, token.head.i):
-                            if token.head.lemma_.lower() not in self.stopwords:
-                                types = self.gender_check(token.head, types, 'IlGender')
+                if head_pos == 'NOUN':
+                    if soa.dep[i] in _AUX_COP:
+                        if self.no_adp(soa, i, soa.head_i[i]):
+                            if soa.lemma_lower[soa.head_i[i]] not in self.stopwords:
+                                types = self.gender_check(head_flags, types, 'IlGender')
                 # Adjectives
-                if token.head.pos_ == 'ADJ':
+                if head_pos == 'ADJ':
                     # First 3 come from SpGender, obl:cmpr is "takiemu jak ty"
-                    if token.dep_ in ['aux:clitic', 'aux:pass', 'cop', 'obl:cmpr', 'obl']:
-                        types = self.gender_check(token.head, types, 'IlGender')
+                    if soa.dep[i] in _ADJ_DEPS:
+                        types = self.gender_check(head_flags, types, 'IlGender')
         return types
 
-    def check_if_formal(self, sentence, src_sentence, types):
-        for token in sentence:
-            if token.orth_.lower() == 'proszę' and not re.findall(r'please|ask', src_sentence.lower()):
-                types['Formality'] = '<formal>'
-
-            if token.lemma_.lower() in ['pan', 'pani'] \
-                    and self.no_det(sentence, token) \
-                    and self.no_appos(sentence, token) \
+    @staticmethod
+    def _has_formal_trigger(soa):
+        """Prescan for the lemma/orth triggers that check_if_formal acts on."""
+        for i in range(len(soa)):
+            if soa.lemma_lower[i] in ('pan', 'pani', 'pański') or soa.lemma[i] == 'państwo' \
+                    or soa.orth[i].lower() == 'proszę':
+                return True
+        return False
+
+    def check_if_formal(self, soa, src_sentence, types):
+        # The proszę branch only ever sets Formality, so one short-circuiting
+        # scan (and a single English regex run) replaces the per-token check.
+        if any(o.lower() == 'proszę' for o in soa.orth) and not _PLEASE_RE.search(src_sentence):
+            types['Formality'] = '<formal>'
+
+        for i in range(len(soa)):
+            if soa.lemma_lower[i] in ['pan', 'pani'] \
+                    and self.no_det(soa, i) \
+                    and self.no_appos(soa, i) \
                     and self.no_title(src_sentence):
                 types['Formality'] = '<formal>'
                 # Check gender of interlocutor
-                types = self.gender_check(token, types, 'IlGender')
+                types = self.gender_check(soa.flags[i], types, 'IlGender')
                 # Check number of interlocutor
-                number = re.findall(r'sg|pl', token._.feats)[0]
-                assert number in ['sg', 'pl']
-                types['IlNumber'] = '<singular>' if number == 'sg' else '<plural>'
+                assert soa.flags[i] & NUMBER
+                types['IlNumber'] = '<singular>' if soa.flags[i] & SG else '<plural>'
                 return types, True
 
-            elif token.lemma_.lower() == 'pański':
+            elif soa.lemma_lower[i] == 'pański':
                 types['Formality'] = '<formal>'
                 types['IlNumber'] = '<singular>'
                 types['IlGender'] = '<il:masculine>'
                 return types, True
 
-            if token.lemma_ == 'państwo' and self.no_det(sentence, token) and self.no_nation(src_sentence):
+            if soa.lemma[i] == 'państwo' and self.no_det(soa, i) and self.no_nation(src_sentence):
                 types['Formality'] = '<formal>'
                 types['IlNumber'] = '<plural>'
                 types['IlGender'] = '<il:mixed>'
@@ -255,49 +453,47 @@ class Detector:
         return types, False
 
     @staticmethod
-    def gender_check(token, types, attr):
+    def gender_check(flags, types, attr):
         assert attr in ['SpGender', 'IlGender']
         prefix = 'il' if attr == 'IlGender' else 'sp'
-        if re.findall(r'm[123]', token._.feats):
+        if flags & MASC:
             types[attr] = f'<{prefix}:masculine>'
-        if 'f' in token._.feats.split(':'):
+        if flags & FEM:
             types[attr] = f'<{prefix}:feminine>'
         return types
 
     @staticmethod
     def no_title(en_sentence):
-        if re.findall(r"lad(ies|y)|gentlem[ea]n|(^| )(sir|mr[ .]|mrs[ .]|ms[ .]|herr)|"
-                      r"lord|master|messieurs|dames|monsieur|madam[e ]|ma'am", en_sentence.lower()):
+        if _TITLE_RE.search(en_sentence):
             return False
         return True
 
     @staticmethod
-    def no_det(sentence, token):
+    def no_det(soa, i):
         """'państwo poszli' vs 'ci państwo poszli'. The latter must be recognised as wrong."""
-        for t in sentence:
-            if t.head == token and t.dep_ == 'det':
+        for k in soa.children[i]:
+            if soa.dep[k] == 'det':
                 return False
         return True
 
     @staticmethod
-    def no_appos(sentence, token):
+    def no_appos(soa, i):
         """'państwo poszli' vs 'ci państwo poszli'. The latter must be recognised as wrong."""
-        for t in sentence:
-            if t.head == token and t.dep_ == 'appos' \
-                    and 'gen' not in t._.feats.split(':'):
+        for k in soa.children[i]:
+            if soa.dep[k] == 'appos' and not soa.flags[k] & GEN:
                 return False
         return True
 
     @staticmethod
     def no_nation(sentence):
-        if re.findall('(countr|nation|land|state|kingdom|realm|econom|elsewhere|rule)|\b', sentence.lower()):
+        if _NATION_RE.search(sentence):
             return False
         return True
 
     @staticmethod
-    def no_adp(parsed, i, j):
-        for x in range(i, j):
-            if parsed[x].pos_ == 'ADP' and parsed[x].head == parsed[j]:
+    def no_adp(soa, i, j):
+        for x in soa.children[j]:
+            if i <= x < j and soa.pos[x] == 'ADP':
                 return False
         return True
 
@@ -309,10 +505,11 @@ def evaluate(attribs, detector, src_file, ref_file, cxt_file, mark_file, hyp_fil
     attrib_counts = {x: [[], []] for x in attribs.attribute_list}
     srcs, refs, hyps, cxts, marks = (read_from_file(x) for x in [src_file, ref_file, hyp_file, cxt_file, mark_file])
 
-    for reference, hypothesis, marking, context in zip(refs, hyps, marks, cxts):
-        attrib = attribs.identify_from_type(marking)
-        attrib_counts[attrib][0] += [reference]
-        attrib_counts[attrib][1] += [hypothesis]
+    # Resolve the marking column to attributes once, then fill with plain appends.
+    attrs = [attribs.identify_from_type(m) for m in marks]
+    for reference, hypothesis, attrib in zip(refs, hyps, attrs):
+        attrib_counts[attrib][0].append(reference)
+        attrib_counts[attrib][1].append(hypothesis)
     agr_corr_hyp, agr_incorr_hyp = detector.calculate_type_agreement(hyps, srcs, marks)
     sum_ = 0
     for att in attribs.attribute_list:
@@ -322,7 +519,7 @@ def evaluate(attribs, detector, src_file, ref_file, cxt_file, mark_file, hyp_fil
     logging.info(f"Average result: {sum_/4:.2f}")
     
 
-def evaluate_unbalanced(attribs, detector, src_file, ref_file, cxt_file, hyp_file):
+def evaluate_unbalanced(attribs, detector, src_file, ref_file, cxt_file, mark_file, hyp_file):
     def read_from_file(filename):
         with open(filename) as f:
             return f.read().splitlines()
@@ -330,10 +527,11 @@ def evaluate_unbalanced(attribs, detector, src_file, ref_file, cxt_file, hyp_fil
     attrib_counts = {x: [[], []] for x in attribs.attribute_list}
     srcs, refs, hyps, cxts, marks = (read_from_file(x) for x in [src_file, ref_file, hyp_file, cxt_file, mark_file])
 
-    for reference, hypothesis, marking, context in zip(refs, hyps, marks, cxts):
-        attrib = attribs.identify_from_type(marking)
-        attrib_counts[attrib][0] += [reference]
-        attrib_counts[attrib][1] += [hypothesis]
+    # Resolve the marking column to attributes once, then fill with plain appends.
+    attrs = [attribs.identify_from_type(m) for m in marks]
+    for reference, hypothesis, attrib in zip(refs, hyps, attrs):
+        attrib_counts[attrib][0].append(reference)
+        attrib_counts[attrib][1].append(hypothesis)
     agr_corr_hyp, agr_incorr_hyp = detector.calculate_type_agreement(hyps, srcs, marks)
     for att in attribs.attribute_list:
         result = agr_corr_hyp[att] / (agr_corr_hyp[att] + agr_incorr_hyp[att]) * 100
@@ -341,22 +539,22 @@ def evaluate_unbalanced(attribs, detector, src_file, ref_file, cxt_file, hyp_fil
     
 
 def compute_pr(answers, golden_answers):
-    stats = {
-        'false_positive': 0,
-        'false_negative': 0,
-        'true_positive': 0,
-        'true_negative': 0
-    }
-    for predicted, actual in zip(answers, golden_answers):
-        predicted = predicted.split(',')
-        actual = actual.split(',')
-        stats['true_positive'] += sum([actual[i] == predicted[i] == '' for i in range(len(predicted))])
-        stats['true_positive'] += sum([actual[i] == predicted[i] and actual[i] != '' for i in range(len(predicted))])
-        stats['false_negative'] += sum([actual[i] != '' and predicted[i] == '' for i in range(len(predicted))])
-        stats['false_positive'] += sum([actual[i] == '' and predicted[i] != '' for i in range(len(predicted))])
-
-    precision = stats['true_positive'] / (stats['true_positive'] + stats['false_positive']) * 100
-    recall = stats['true_positive'] / (stats['true_positive'] + stats['false_negative']) * 100
+    # Encode each comma-separated annotation as a row of small ints (0 = no
+    # type) and tally the confusion counts with vectorized comparisons instead
+    # of a Python double loop over split strings.
+    type_id = {'': 0}
+
+    def encode(lines):
+        return np.array([[type_id.setdefault(x, len(type_id)) for x in line.split(',')]
+                         for line in lines], dtype=np.int8)
+
+    predicted, actual = encode(answers), encode(golden_answers)
+    true_positive = int(np.count_nonzero(predicted == actual))
+    false_negative = int(np.count_nonzero((actual != 0) & (predicted == 0)))
+    false_positive = int(np.count_nonzero((actual == 0) & (predicted != 0)))
+
+    precision = true_positive / (true_positive + false_positive) * 100
+    recall = true_positive / (true_positive + false_negative) * 100
     logging.info(f"{precision = }; {recall = }")
     return (2 * precision * recall) / (precision + recall)
 
@@ -378,28 +576,30 @@ def annotate_corpus(prefix: str, detector: Detector) -> None:
     return annotations
 
 def read_from_file(filename, config='pretrain'):
+    # The corpora are line-delimited text, so build the frame from the line
+    # lists in one go; the previous per-column DataFrame + concat route copied
+    # every column twice. Series keep the outer-join padding for ragged files.
     with open(filename + '.en', 'r') as s, open(filename + '.pl', 'r') as t:
-        df = pd.concat([pd.DataFrame(s.read().splitlines()),
-                        pd.DataFrame(t.read().splitlines())], axis=1, join='outer', ignore_index=True)
-    df.columns = ['en', 'pl']
+        columns = {'en': s.read().splitlines(), 'pl': t.read().splitlines()}
     if config != 'pretrain':
         with open(filename + '.cxt', 'r') as c:
-            lines = c.read().splitlines()
-            df = pd.concat([df, pd.DataFrame(lines)], axis=1, join='outer', ignore_index=True)
-        df.columns = ['en', 'pl', 'cxt']
-    return df
+            columns['cxt'] = c.read().splitlines()
+    return pd.DataFrame({name: pd.Series(lines) for name, lines in columns.items()})
 
 
 if __name__ == '__main__':
     parser = ArgumentParser()
-    parser.add_argument('--dev', default=False, action='store_true', type=bool)
-    parser.add_argument('--test', default=True, action='store_true', type=bool)
+    parser.add_argument('--dev', default=False, action='store_true')
+    parser.add_argument('--test', default=True, action='store_true')
     parser.add_argument('--hyp', required=True, help='File with hypotheses')
     parser.add_argument('--nocheck', default=False, help='Disable intro test')
     parser.add_argument('--path_to_root', default='./', help='Path to the eamt_annotation_tool directory')
+    parser.add_argument('--batch_size', default=64, type=int, help='Batch size for the spaCy parser')
+    parser.add_argument('--n_process', default=None, type=int,
+                        help='Parser worker processes; defaults to all cores but one')
     args = parser.parse_args()
 
-    d = Detector(args.path_to_root)
+    d = Detector(args.path_to_root, batch_size=args.batch_size, n_process=args.n_process)
     a = Attributes()
     split = 'dev' if args.dev else 'test'
 